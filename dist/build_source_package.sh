@@ -44,7 +44,8 @@ check_tools() {
     local cmd missing=()
 
     for cmd in "${@}"; do
-        if ! command -v "${cmd}" >/dev/null; then
+        if ! command -v "${cmd}" >/dev/null \
+                && ! in_array "${cmd}" "${missing[@]}"; then
             missing+=("${cmd}")
         fi
     done
@@ -58,15 +59,67 @@ check_tools() {
     fi
 }
 
+# Check the tools needed by every selected action in a single pass so that a
+# missing tool fails the run before any build work has been done.
+check_action_tools() {
+    local -a tools=(git tar xz)
+
+    if [[ "${vendor}" == true ]]; then
+        tools+=(cargo)
+    fi
+
+    if in_array srpm "${actions[@]}"; then
+        tools+=(rpmbuild)
+    fi
+
+    if in_array pkgbuild "${actions[@]}"; then
+        tools+=(sha256sum)
+    fi
+
+    if in_array dsc "${actions[@]}"; then
+        # Building a source package requires all build deps to be installed
+        # because the process runs `debian/rules clean`.
+        tools+=(dch debuild cargo dh-exec)
+    fi
+
+    check_tools "${tools[@]}"
+}
+
+# Hardlink a file into place so that no file data is copied, falling back to
+# a regular copy if the source and target are on different filesystems.
+link_or_copy() {
+    ln -f "${1}" "${2}" 2>/dev/null || cp "${1}" "${2}"
+}
+
 # Build tarball to be used for all distro's packaging
 build_tarball() {
     local prefix="ipmi-fan-control-${full_version}"
+
+    if [[ "${vendor}" != true ]]; then
+        # Since nothing needs to modify the tree, stream git archive's output
+        # straight into xz instead of going through a staging directory and a
+        # second tar invocation. git archive's tar output is already
+        # deterministic for a given commit.
+        tarball="${output_dir}/${prefix}.tar.xz"
+        tarball_name=${tarball##*/}
+
+        git -C "${source_root}" \
+            archive \
+            --format tar \
+            --prefix "${prefix}/" \
+            HEAD \
+            | xz -T0 > "${tarball}"
+
+        return
+    fi
+
     tarball="${output_dir}/${prefix}.vendored.tar.xz"
+    tarball_name=${tarball##*/}
 
     local staging_dir="${temp_dir}/tarball/${prefix}"
     mkdir -p "${staging_dir}"
 
-    git -C "$(git rev-parse --show-toplevel)" \
+    git -C "${source_root}" \
         archive \
         --format tar \
         HEAD \
@@ -77,15 +130,26 @@ build_tarball() {
     # builds.
     pushd "${staging_dir}" >/dev/null
     cargo vendor
-    # Remove prebuilt winapi libraries
-    rm -r vendor/winapi-*/lib
+    # Remove prebuilt winapi libraries. The glob matches several independent
+    # trees containing many files each, so unlink them in parallel.
+    local dir rm_pid rm_pids=()
+    for dir in vendor/winapi-*/lib; do
+        rm -r "${dir}" &
+        rm_pids+=("${!}")
+    done
+    for rm_pid in "${rm_pids[@]}"; do
+        wait "${rm_pid}"
+    done
     popd >/dev/null
 
     mkdir "${staging_dir}"/.cargo
-    cp cargo.vendored.toml "${staging_dir}"/.cargo/config
+    link_or_copy cargo.vendored.toml "${staging_dir}"/.cargo/config
 
     # Create a byte-for-byte reproducible tarball
     # See: https://reproducible-builds.org/docs/archives/
+    # xz is run with -T0 to compress blocks on all cores. The output is still
+    # deterministic because the block size is fixed by the preset, not by the
+    # thread count.
     tar -C "${temp_dir}/tarball" \
         --sort=name \
         --mtime @0 \
@@ -93,30 +157,33 @@ build_tarball() {
         --group 0 \
         --numeric-owner \
         --pax-option 'exthdr.name=%d/PaxHeaders/%f,delete=atime,delete=ctime' \
-        -Jcf "${tarball}" \
+        --use-compress-program 'xz -T0' \
+        -cf "${tarball}" \
         "${prefix}"
 }
 
 # Build source RPM for Fedora/CentOS
 build_srpm() {
-    check_tools rpmbuild
-
     mkdir -p "${temp_dir}"/rpm/{SOURCES,SPECS}
     sed \
         -e "s/@VERSION@/${version}/g" \
         -e "s/@SUFFIX@/${version_suffix}/g" \
-        -e "s/@TARBALL_NAME@/$(basename "${tarball}")/g" \
+        -e "s/@TARBALL_NAME@/${tarball_name}/g" \
         < rpm/ipmi-fan-control.spec.in \
         > "${temp_dir}"/rpm/SPECS/ipmi-fan-control.spec
-    cp ipmi-fan-control.service.in "${temp_dir}"/rpm/SOURCES/
-    cp "${tarball}" "${temp_dir}"/rpm/SOURCES/
+    link_or_copy ipmi-fan-control.service.in "${temp_dir}"/rpm/SOURCES/
+    link_or_copy "${tarball}" "${temp_dir}"/rpm/SOURCES/
 
     rpmbuild \
         --define "_topdir ${temp_dir}/rpm" \
         -bs "${temp_dir}"/rpm/SPECS/ipmi-fan-control.spec
 
+    local file
+
     mkdir -p "${output_dir}"/rpm
-    cp -v "${temp_dir}"/rpm/SRPMS/*.src.rpm "${output_dir}"/rpm/
+    for file in "${temp_dir}"/rpm/SRPMS/*.src.rpm; do
+        link_or_copy "${file}" "${output_dir}"/rpm/
+    done
 }
 
 build_pkgbuild() {
@@ -125,35 +192,42 @@ build_pkgbuild() {
     mkdir -p "${temp_dir}"/pkgbuild
     sed \
         -e "s/@VERSION@/${full_version}/g" \
-        -e "s/@TARBALL_NAME@/$(basename "${tarball}")/g" \
+        -e "s/@TARBALL_NAME@/${tarball_name}/g" \
         -e "s/@TARBALL_SHA256@/${tarball_sha256%% *}/g" \
         < pkgbuild/PKGBUILD.in \
         > "${temp_dir}"/pkgbuild/PKGBUILD
 
-    cp "${tarball}" "${temp_dir}"/pkgbuild/
+    link_or_copy "${tarball}" "${temp_dir}"/pkgbuild/
+
+    local file
 
     mkdir -p "${output_dir}"/pkgbuild
-    cp -v "${temp_dir}"/pkgbuild/* "${output_dir}"/pkgbuild/
+    for file in "${temp_dir}"/pkgbuild/*; do
+        link_or_copy "${file}" "${output_dir}"/pkgbuild/
+    done
 }
 
 # Build deb source package for Debian/Ubuntu
 build_dsc() {
-    check_tools dch debuild
-    # These are here to make the build fail faster. Building a source package
-    # requires all build deps to be installed because the process runs
-    # `debian/rules clean`.
-    check_tools cargo dh-exec
-
     # Debian/Ubuntu seem to prefer plusses over dots for git versions
     local deb_full_version=${version}${version_suffix//./+}
 
-    cp "${tarball}" "${temp_dir}/ipmi-fan-control_${deb_full_version}.orig.tar.xz"
-    tar -xf "${tarball}" -C "${temp_dir}"
+    link_or_copy "${tarball}" "${temp_dir}/ipmi-fan-control_${deb_full_version}.orig.tar.xz"
 
     local source_dir="${temp_dir}/ipmi-fan-control-${full_version}"
+    local staging_dir="${temp_dir}/tarball/ipmi-fan-control-${full_version}"
+
+    # The tarball was built from the staging tree in this same temp directory,
+    # so hardlink that into place instead of decompressing and re-extracting
+    # the archive.
+    if [[ -d "${staging_dir}" ]]; then
+        cp -al "${staging_dir}" "${source_dir}"
+    else
+        tar -xf "${tarball}" -C "${temp_dir}"
+    fi
 
     cp -r debian "${source_dir}"/
-    cp ipmi-fan-control.service.in "${source_dir}"/debian/
+    link_or_copy ipmi-fan-control.service.in "${source_dir}"/debian/
 
     pushd "${temp_dir}/ipmi-fan-control-${full_version}" >/dev/null
 
@@ -178,7 +252,14 @@ build_dsc() {
         "${dch_extra_args[@]}" \
         "Automatically built from version ${full_version}"
 
-    debuild -S "${debuild_extra_args[@]}"
+    # xz compression of the source inside dpkg-source is the slowest part of
+    # this step, so let it use every core. parallel=N likewise lets
+    # debian/rules fan out where it can. debuild sanitizes the environment,
+    # keeping only DEB_*-prefixed and explicitly preserved variables, so
+    # XZ_OPT has to be passed through by name.
+    DEB_BUILD_OPTIONS="parallel=$(nproc)" \
+        XZ_OPT=-T0 \
+        debuild --preserve-envvar XZ_OPT -S "${debuild_extra_args[@]}"
 
     popd >/dev/null
 
@@ -202,9 +283,13 @@ help() {
     echo "Usage: ${0} -t <target> [<option>...]"
     echo
     echo 'Options:'
-    echo '  -t, --target         Type of source package to build'
+    echo '  -t, --target         Type of source package to build (can be'
+    echo '                       specified multiple times)'
     echo '  -k, --keep-temp-dir  Do not delete temp directory on exit'
     echo
+    echo 'tarball-only options:'
+    echo '  --no-vendor          Do not vendor Rust dependencies into the tarball'
+    echo
     echo 'dsc-only options:'
     echo '  --dsc-distro NAME    Target distro for dsc package upload'
     echo '  --dsc-suffix SUFFIX  Version suffix for dsc package upload'
@@ -243,8 +328,8 @@ in_array() {
 }
 
 parse_args() {
-    local args target=
-    if ! args=$(getopt -o hkt: -l dsc-distro:,dsc-signed,dsc-suffix:,help,keep-temp-dir,target: -n "${0}" -- "${@}"); then
+    local args target targets=()
+    if ! args=$(getopt -o hkt: -l dsc-distro:,dsc-signed,dsc-suffix:,help,keep-temp-dir,no-vendor,target: -n "${0}" -- "${@}"); then
         echo >&2 'Failed to parse arguments'
         help >&2
         exit 1
@@ -253,6 +338,7 @@ parse_args() {
     eval set -- "${args}"
 
     keep_temp_dir=false
+    vendor=true
     dsc_signed=false
     dsc_distro=
     dsc_suffix=
@@ -268,7 +354,7 @@ parse_args() {
             shift 1
             ;;
         -t|--target)
-            target=${2}
+            targets+=("${2}")
             shift 2
             ;;
         --dsc-distro)
@@ -283,6 +369,10 @@ parse_args() {
             dsc_suffix=${2}
             shift 2
             ;;
+        --no-vendor)
+            vendor=false
+            shift
+            ;;
         --)
             shift
             break
@@ -296,32 +386,36 @@ parse_args() {
         exit 1
     fi
 
-    actions=()
-
-    case "${target}" in
-    tarball)
-        actions+=(tarball)
-        ;;
-    srpm)
-        actions+=(tarball srpm)
-        ;;
-    pkgbuild)
-        actions+=(tarball pkgbuild)
-        ;;
-    dsc)
-        actions+=(tarball dsc)
-        ;;
-    '')
+    if [[ "${#targets[@]}" -eq 0 ]]; then
         echo >&2 "No target specified"
         help >&2
         exit 1
-        ;;
-    *)
-        echo >&2 "Unknown target: ${target}"
-        help >&2
+    fi
+
+    # Every target needs the tarball, so it always comes first.
+    actions=(tarball)
+
+    for target in "${targets[@]}"; do
+        case "${target}" in
+        tarball)
+            ;;
+        srpm|pkgbuild|dsc)
+            if ! in_array "${target}" "${actions[@]}"; then
+                actions+=("${target}")
+            fi
+            ;;
+        *)
+            echo >&2 "Unknown target: ${target}"
+            help >&2
+            exit 1
+            ;;
+        esac
+    done
+
+    if [[ "${vendor}" != true ]] && [[ "${#actions[@]}" -gt 1 ]]; then
+        echo >&2 "--no-vendor can only be used when building just the tarball."
         exit 1
-        ;;
-    esac
+    fi
 
     if ! in_array dsc "${actions[@]}" \
             && [[ -n "${dsc_distro}" || -n "${dsc_suffix}" || "${dsc_signed}" != false ]]; then
@@ -333,6 +427,7 @@ parse_args() {
 ###
 
 parse_args "${@}"
+check_action_tools
 
 output_dir=$(pwd)/output
 mkdir -p "${output_dir}"
@@ -340,11 +435,34 @@ mkdir -p "${output_dir}"
 temp_dir=$(mktemp -d -p "$(pwd)")
 trap clean_up EXIT
 
+# Resolved once so that the actions don't each need to spawn git
+source_root=$(git rev-parse --show-toplevel)
+
 compute_version
 echo "Version: ${version}"
 echo "Commits since tag: ${plus_rev}"
 echo "HEAD short commit: ${git_commit}"
 
-for action in "${actions[@]}"; do
-    build_"${action}"
+# All other actions consume the tarball, but are independent of one another
+# and spend nearly all of their time waiting on external tools (rpmbuild,
+# debuild, tar), so build the tarball first and then run the rest in parallel.
+build_tarball
+
+pids=()
+
+for action in "${actions[@]:1}"; do
+    build_"${action}" &
+    pids+=("${!}")
+done
+
+failed=false
+
+for pid in "${pids[@]}"; do
+    if ! wait "${pid}"; then
+        failed=true
+    fi
 done
+
+if [[ "${failed}" == true ]]; then
+    exit 1
+fi